@@ -0,0 +1,423 @@
+# -*- coding: utf-8 -*-
+import argparse
+import gzip
+import json
+import mmap
+import os
+import re
+import sys
+import time
+import zlib
+from collections import namedtuple
+from datetime import datetime, date, timedelta
+
+INDEX_SUFFIX = '.idx'
+# Logs compressed by retention are searched too, streamed with no index
+COMPRESSED_SUFFIX = '.gz'
+__INDEX_VERSION = 2
+__INDEX_HEAD_SIZE = 256
+__MINUTE_SIZE = len('YYYY-MM-DD HH:MM')
+__MINUTE_FORMAT = '%Y-%m-%d %H:%M'
+__TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+__ENCODING = 'utf-8'
+# Processes keep writing into the day directory of the date they started on (see utils.__log_dir)
+__LOOKBACK_DAYS = 7
+
+# Same header written by utils.__log: '<timestamp> - [<LEVEL>]: <indent>> <text>'
+__RECORD_HEADER = re.compile(rb'(\d{4}-\d{2}-\d{2} \d{2}:\d{2}:\d{2}(?:[.,]\d+)?) - \[([A-Z]+)\]: ?')
+__LOG_FILE_NAME = re.compile(r'^(?P<script>.+)_(?P<pid>\d+)(?P<database>_database)?\.log(?P<compressed>\.gz)?$')
+
+# Same base directory used by utils for the log and files trees
+BASE_DIR = os.path.dirname(sys.argv[0] if sys.argv[0] else '.')
+__log_root = os.path.join(BASE_DIR, 'log')
+
+LogRecord = namedtuple('LogRecord', ['file', 'offset', 'timestamp', 'level', 'text'])
+
+
+def __index_file(file):
+    return file + INDEX_SUFFIX
+
+
+def __empty_index():
+    # size: file size seen on the last scan, scanned: bytes of complete lines indexed (without a pending last line)
+    return {'version': __INDEX_VERSION, 'size': 0, 'scanned': 0, 'head_size': 0, 'head': 0, 'minutes': []}
+
+
+def __read_index(file):
+    try:
+        with open(__index_file(file), 'r', encoding=__ENCODING) as f:
+            index = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return index if index.get('version') == __INDEX_VERSION else None
+
+
+def __write_index(file, index):
+    temp_file = '{i}.{p}.tmp'.format(i=__index_file(file), p=os.getpid())
+    try:
+        with open(temp_file, 'w', encoding=__ENCODING) as f:
+            json.dump(index, f, separators=(',', ':'))
+        os.replace(temp_file, __index_file(file))
+    except OSError:
+        # Read-only trees can still be searched, only without a persisted index
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+
+
+def __scan(mm, start, end, minutes):
+    '''
+    Index the complete lines of <mm> between <start> and <end>, merging into <minutes>
+
+    :param mm: mapped log file
+    :param start: first byte to scan (always the beginning of a line)
+    :param end: scan limit
+    :param minutes: list of [minute, first byte, last byte, {level: count}] to be extended
+    :return: offset right after the last complete line scanned
+    '''
+
+    position = start
+    while position < end:
+        line_end = mm.find(b'\n', position, end)
+        if line_end == -1:
+            # Incomplete line still being written, left for the next scan
+            break
+        match = __RECORD_HEADER.match(mm, position, line_end)
+        if match:
+            minute = match.group(1)[:__MINUTE_SIZE].decode('ascii')
+            if not minutes or minutes[-1][0] != minute:
+                minutes.append([minute, position, position, {}])
+            counts = minutes[-1][3]
+            level = match.group(2).decode('ascii')
+            counts[level] = counts.get(level, 0) + 1
+        if minutes:
+            minutes[-1][2] = line_end + 1
+        position = line_end + 1
+    return position
+
+
+def build_log_index(file):
+    '''
+    Build (or incrementally update) the sidecar index <file>.idx of a log file. The index keeps, for each timestamp
+    minute, the byte slice of the file holding its records and how many records of each level it has
+
+    :param file: full path of a log file
+    :return: index as a dict
+    '''
+
+    size = os.path.getsize(file)
+    index = __read_index(file) or __empty_index()
+    if size == 0:
+        return __empty_index()
+
+    with open(file, 'rb') as f:
+        with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+            # A shrunk file or a different head means the log was truncated and written again
+            if index['size'] > size or zlib.crc32(mm[:index['head_size']]) != index['head']:
+                index = __empty_index()
+            if index['size'] < size:
+                index['scanned'] = __scan(mm, index['scanned'], size, index['minutes'])
+                index['size'] = size
+                index['head_size'] = min(__INDEX_HEAD_SIZE, size)
+                index['head'] = zlib.crc32(mm[:index['head_size']])
+                __write_index(file, index)
+    return index
+
+
+def log_month(name):
+    '''
+    Return the month number of a log month directory name (<MM.Mon>)
+    '''
+
+    return int(name.split('.')[0])
+
+
+def dated_children(path, parse):
+    '''
+    List the sub directories of <path> whose names are parsed by <parse> into a number, ordered by that number
+    '''
+
+    try:
+        names = os.listdir(path)
+    except OSError:
+        return []
+    children = []
+    for name in names:
+        try:
+            value = parse(name)
+        except ValueError:
+            continue
+        if os.path.isdir(os.path.join(path, name)):
+            children.append((value, os.path.join(path, name)))
+    return sorted(children)
+
+
+def __in_range(key, first, last):
+    return (not first or key >= first[:len(key)]) and (not last or key <= last[:len(key)])
+
+
+def iter_log_files(start: datetime = None, end: datetime = None, script: str = None, database: bool = None,
+                   log_root: str = None, lookback: int = __LOOKBACK_DAYS):
+    '''
+    Walk the dated log tree (log/<year>/<MM.Mon>/<day>) descending only into the directories between <start> and
+    <end>. A process writes into the directory of the day it started on, so the <lookback> days before <start> are
+    visited too, listing only their files modified since <start>. Logs compressed by retention (.log.gz) are listed too
+
+    :param start: first datetime (or date) of interest
+    :param end: last datetime (or date) of interest
+    :param script: script name (without .py) whose logs are wanted. All scripts if not specified
+    :param database: True for database logs only, False for application logs only, None for both
+    :param log_root: root of the log tree. Defaults to the log directory next to the running script
+    :param lookback: days before <start> whose directories may hold files of long running processes
+    :return: generator of full paths of log files, in chronological directory order
+    '''
+
+    start_day = (start.year, start.month, start.day) if start else None
+    modified_since = time.mktime(start.timetuple()) if start else None
+    first = start - timedelta(days=lookback) if start else None
+    first = (first.year, first.month, first.day) if first else None
+    last = (end.year, end.month, end.day) if end else None
+    for year, year_dir in dated_children(log_root or __log_root, int):
+        if not __in_range((year,), first, last):
+            continue
+        for month, month_dir in dated_children(year_dir, log_month):
+            if not __in_range((year, month), first, last):
+                continue
+            for day, day_dir in dated_children(month_dir, int):
+                if not __in_range((year, month, day), first, last):
+                    continue
+                for name in sorted(os.listdir(day_dir)):
+                    match = __LOG_FILE_NAME.match(name)
+                    if not match:
+                        continue
+                    if script and match.group('script') != script.replace('.py', ''):
+                        continue
+                    if database is not None and bool(match.group('database')) != database:
+                        continue
+                    file = os.path.join(day_dir, name)
+                    if start_day and (year, month, day) < start_day and os.path.getmtime(file) < modified_since:
+                        continue
+                    yield file
+
+
+def __level_names(levels):
+    return {str(getattr(level, 'name', level)).upper() for level in levels} if levels else None
+
+
+def __bound(moment):
+    return moment.strftime(__TIMESTAMP_FORMAT) if moment else None
+
+
+def __accept(record, levels, regex, first, last):
+    return ((not levels or record.level in levels) and
+            (not first or record.timestamp >= first) and
+            (not last or record.timestamp < last) and
+            (not regex or regex.search(record.text)))
+
+
+def __mapped_lines(mm, start, end):
+    '''
+    Yield (offset, line) of the slice <start>:<end> of <mm>
+    '''
+
+    position = start
+    while position < end:
+        line_end = mm.find(b'\n', position, end)
+        line_end = end if line_end == -1 else line_end
+        yield position, mm[position:line_end]
+        position = line_end + 1
+
+
+def __compressed_lines(file):
+    '''
+    Yield (offset on uncompressed content, line) of a compressed log, streaming it
+    '''
+
+    position = 0
+    with gzip.open(file, 'rb') as f:
+        for line in f:
+            yield position, line.rstrip(b'\n')
+            position += len(line)
+
+
+def __read_records(file, lines):
+    '''
+    Parse the records of <lines> ((offset, line) pairs). Lines without a header are appended to the previous record
+    '''
+
+    record = None
+    for position, line in lines:
+        match = __RECORD_HEADER.match(line)
+        if match:
+            if record:
+                yield LogRecord(*record)
+            text = line[match.end():].decode(__ENCODING, errors='replace').rstrip('\r')
+            record = [file, position, match.group(1).decode('ascii'), match.group(2).decode('ascii'), text]
+        elif record:
+            record[4] += '\n' + line.decode(__ENCODING, errors='replace').rstrip('\r')
+    if record:
+        yield LogRecord(*record)
+
+
+def search_logs(start: datetime = None, end: datetime = None, levels: list = None, script: str = None,
+                database: bool = None, pattern: str = None, log_root: str = None, lookback: int = __LOOKBACK_DAYS):
+    '''
+    Search records on the dated log tree. Only the minutes of each file within <start> and <end> having records of
+    the requested <levels> are read, using the sidecar index of each file. Logs compressed by retention (.log.gz) have
+    no index and are read entirely, streamed
+
+    :param start: first datetime of interest (inclusive)
+    :param end: last datetime of interest (exclusive)
+    :param levels: LogLevel items or level names wanted. All levels if not specified
+    :param script: script name (without .py) whose logs are wanted. All scripts if not specified
+    :param database: True for database logs only, False for application logs only, None for both
+    :param pattern: regular expression to be searched on record text
+    :param log_root: root of the log tree. Defaults to the log directory next to the running script
+    :param lookback: days before <start> whose directories may hold records of long running processes
+    :return: generator of LogRecord
+    '''
+
+    levels = __level_names(levels)
+    regex = re.compile(pattern) if pattern else None
+    first, last = __bound(start), __bound(end)
+    first_minute = start.strftime(__MINUTE_FORMAT) if start else None
+    last_minute = end.strftime(__MINUTE_FORMAT) if end else None
+
+    for file in iter_log_files(start=start, end=end, script=script, database=database, log_root=log_root,
+                               lookback=lookback):
+        if file.endswith(COMPRESSED_SUFFIX):
+            for record in __read_records(file, __compressed_lines(file)):
+                if __accept(record, levels, regex, first, last):
+                    yield record
+            continue
+        slices = [(begin, finish) for minute, begin, finish, counts in build_log_index(file)['minutes']
+                  if (not first_minute or minute >= first_minute) and
+                  (not last_minute or minute <= last_minute) and
+                  (not levels or levels.intersection(counts))]
+        if not slices:
+            continue
+        with open(file, 'rb') as f:
+            with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                for begin, finish in slices:
+                    for record in __read_records(file, __mapped_lines(mm, begin, finish)):
+                        if __accept(record, levels, regex, first, last):
+                            yield record
+
+
+def follow_log(file, levels: list = None, pattern: str = None, interval: float = 1.0, from_start: bool = False):
+    '''
+    Follow a log file as it grows (like tail -f). Truncated files are read again from the beginning
+
+    :param file: full path of a log file
+    :param levels: LogLevel items or level names wanted. All levels if not specified
+    :param pattern: regular expression to be searched on record text
+    :param interval: seconds to wait between checks when no new record is found
+    :param from_start: read the records already on file before following it
+    :return: endless generator of LogRecord
+    '''
+
+    levels = __level_names(levels)
+    regex = re.compile(pattern) if pattern else None
+    position = 0 if from_start or not os.path.exists(file) else os.path.getsize(file)
+    pending = b''
+    record = None
+
+    while True:
+        try:
+            size = os.path.getsize(file)
+        except OSError:
+            size = position
+        if size < position:
+            position, pending, record = 0, b'', None
+        if size == position:
+            # Nothing new: the held record will not have more lines appended
+            if record:
+                if __accept(LogRecord(*record), levels, regex, None, None):
+                    yield LogRecord(*record)
+                record = None
+            time.sleep(interval)
+            continue
+
+        with open(file, 'rb') as f:
+            f.seek(position)
+            chunk = pending + f.read(size - position)
+        line_start = position - len(pending)
+        position = size
+        lines = chunk.split(b'\n')
+        pending = lines.pop()
+        for line in lines:
+            match = __RECORD_HEADER.match(line)
+            if match:
+                if record and __accept(LogRecord(*record), levels, regex, None, None):
+                    yield LogRecord(*record)
+                text = line[match.end():].decode(__ENCODING, errors='replace').rstrip('\r')
+                record = [file, line_start, match.group(1).decode('ascii'), match.group(2).decode('ascii'), text]
+            elif record:
+                record[4] += '\n' + line.decode(__ENCODING, errors='replace').rstrip('\r')
+            line_start += len(line) + 1
+
+
+def __parse_moment(text):
+    '''
+    Parse a command line moment: 'YYYY-MM-DD HH:MM[:SS]', 'YYYY-MM-DD' or 'HH:MM' (today)
+    '''
+
+    for fmt in (__TIMESTAMP_FORMAT, __MINUTE_FORMAT, '%Y-%m-%dT%H:%M:%S', '%Y-%m-%dT%H:%M', '%Y-%m-%d'):
+        try:
+            return datetime.strptime(text, fmt)
+        except ValueError:
+            pass
+    try:
+        return datetime.combine(date.today(), datetime.strptime(text, '%H:%M').time())
+    except ValueError:
+        raise argparse.ArgumentTypeError('invalid date/time: {t}'.format(t=text))
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Search records on the dated log tree (log/<year>/<MM.Mon>/<day>). '
+                                                 'Logs compressed by retention (.log.gz) are searched too, without '
+                                                 'index (slower)')
+    # Run as a script, sys.argv[0] is this module: default to the log tree of the current directory instead
+    parser.add_argument('--root', default=os.path.join(os.curdir, 'log'),
+                        help='root of the log tree (default: %(default)s)')
+    parser.add_argument('--since', type=__parse_moment, help='first date/time (inclusive)')
+    parser.add_argument('--until', type=__parse_moment, help='last date/time (exclusive)')
+    parser.add_argument('--level', action='append', help='level to be shown, may be repeated (ex.: ERROR)')
+    parser.add_argument('--script', help='script name whose logs are wanted')
+    parser.add_argument('--database', choices=['only', 'skip'], help='database logs only or skip them')
+    parser.add_argument('--grep', help='regular expression to be searched on record text')
+    parser.add_argument('--follow', action='store_true',
+                        help='follow the newest log written today (or --file) instead of searching')
+    parser.add_argument('--file', help='log file to be followed')
+    parser.add_argument('--interval', type=float, default=1.0, help='seconds between checks when following')
+    parser.add_argument('--lookback', type=int, default=__LOOKBACK_DAYS,
+                        help='days before --since (or today, when following) whose directories may hold logs of long '
+                             'running processes (default: %(default)s)')
+    options = parser.parse_args(args)
+    database = {'only': True, 'skip': False}.get(options.database)
+
+    if options.follow:
+        file = options.file
+        if not file:
+            today = datetime.combine(date.today(), datetime.min.time())
+            files = [f for f in iter_log_files(start=today, end=today, script=options.script, database=database,
+                                               log_root=options.root, lookback=options.lookback)
+                     if not f.endswith(COMPRESSED_SUFFIX)]
+            if not files:
+                parser.error('no log file written today under {r}'.format(r=options.root))
+            file = max(files, key=os.path.getmtime)
+        print('following {f}'.format(f=file))
+        records = follow_log(file, levels=options.level, pattern=options.grep, interval=options.interval)
+    else:
+        records = search_logs(start=options.since, end=options.until, levels=options.level, script=options.script,
+                              database=database, pattern=options.grep, log_root=options.root,
+                              lookback=options.lookback)
+
+    try:
+        for record in records:
+            print('{f}: {t} - [{l}]: {x}'.format(f=record.file, t=record.timestamp, l=record.level, x=record.text))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,366 @@
+# -*- coding: utf-8 -*-
+import argparse
+import gzip
+import json
+import os
+import shutil
+import threading
+import time
+from collections import namedtuple
+from datetime import date, datetime, timedelta
+
+try:
+    from .log_search import BASE_DIR, COMPRESSED_SUFFIX, INDEX_SUFFIX, dated_children, log_month
+except ImportError:  # executed as a script
+    from log_search import BASE_DIR, COMPRESSED_SUFFIX, INDEX_SUFFIX, dated_children, log_month
+
+__TEMP_SUFFIX = '.tmp'
+__STATE_FILE = '.retention.json'
+__COPY_BUFFER_SIZE = 1024 * 1024
+__ENCODING = 'utf-8'
+# Days behind the state marks visited again on each run: long running processes reopen (or recreate) the logs of
+# the day they started on, after it was compressed or deleted
+__RECHECK_DAYS = 7
+__ENGLISH_MONTHS = ['jan', 'feb', 'mar', 'apr', 'may', 'jun', 'jul', 'aug', 'sep', 'oct', 'nov', 'dec']
+
+# Days after which a date directory is compressed (gzip) / deleted. None disables the action
+RetentionPolicy = namedtuple('RetentionPolicy', ['compress_after', 'delete_after'])
+
+LOG_TREE = 'log'
+FILES_TREE = 'files'
+
+
+def __files_month(name):
+    # files/<year>/<Mon>/<day>, with the month abbreviation of the locale that created it
+    name = name.lower()
+    for month in range(1, 13):
+        if name in (date(2000, month, 1).strftime('%b').lower(), __ENGLISH_MONTHS[month - 1]):
+            return month
+    raise ValueError('invalid month directory: {n}'.format(n=name))
+
+
+__TREE_MONTHS = {
+    LOG_TREE: log_month,
+    FILES_TREE: __files_month,
+}
+
+
+def __read_state(root):
+    try:
+        with open(os.path.join(root, __STATE_FILE), 'r', encoding=__ENCODING) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+
+def __write_state(root, state):
+    state_file = os.path.join(root, __STATE_FILE)
+    with open(state_file + __TEMP_SUFFIX, 'w', encoding=__ENCODING) as f:
+        json.dump(state, f)
+    os.replace(state_file + __TEMP_SUFFIX, state_file)
+
+
+def __dated_days(root, parse_month, after, before):
+    '''
+    Yield (date, path) of the day directories of <root> dated after <after> (if any) and before <before>. Years and
+    months out of that range are not listed
+
+    :param root: root of the dated tree
+    :param parse_month: function returning the month number of a month directory name
+    :param after: exclusive lower date limit, or None
+    :param before: exclusive upper date limit
+    '''
+
+    for year, year_dir in dated_children(root, int):
+        if (after and year < after.year) or year > before.year:
+            continue
+        for month, month_dir in dated_children(year_dir, parse_month):
+            if (after and (year, month) < (after.year, after.month)) or (year, month) > (before.year, before.month):
+                continue
+            for day, day_dir in dated_children(month_dir, int):
+                try:
+                    day_date = date(year, month, day)
+                except ValueError:
+                    continue
+                if (after and day_date <= after) or day_date >= before:
+                    continue
+                yield day_date, day_dir
+
+
+def __remove_empty_parents(path, root):
+    parent = os.path.dirname(path)
+    while os.path.abspath(parent) != os.path.abspath(root):
+        try:
+            os.rmdir(parent)
+        except OSError:
+            # Not empty (or in use): the upper directories aren't empty either
+            break
+        parent = os.path.dirname(parent)
+
+
+def compress_file(file):
+    '''
+    Compress <file> to <file>.gz streaming its content, then remove it. The original modification time is kept. If
+    <file>.gz already exists (a log reopened by a long running process after being compressed), the new content is
+    appended to it as another gzip member, which gzip readers see as a single stream
+
+    :param file: full path of file
+    :return: full path of compressed file
+    '''
+
+    target = file + COMPRESSED_SUFFIX
+    temp_file = target + __TEMP_SUFFIX
+    try:
+        with open(file, 'rb') as source, gzip.open(temp_file, 'wb') as destination:
+            shutil.copyfileobj(source, destination, __COPY_BUFFER_SIZE)
+        status = os.stat(file)
+        if os.path.exists(target):
+            with open(temp_file, 'rb') as source, open(target, 'ab') as destination:
+                shutil.copyfileobj(source, destination, __COPY_BUFFER_SIZE)
+            os.remove(temp_file)
+        else:
+            os.replace(temp_file, target)
+        os.utime(target, (status.st_atime, status.st_mtime))
+    except OSError:
+        if os.path.exists(temp_file):
+            os.remove(temp_file)
+        raise
+    os.remove(file)
+    return target
+
+
+def __delete_day(path, modified_before):
+    '''
+    Delete every file of a day directory not modified since <modified_before>, then the emptied directories
+
+    :return: number of files deleted and True if the day directory was removed
+    '''
+
+    count = 0
+    for directory, _, names in os.walk(path, topdown=False):
+        for name in names:
+            file = os.path.join(directory, name)
+            try:
+                # Search indexes are rewritten on every search, their mtime says nothing about the log
+                if name.endswith(INDEX_SUFFIX) or os.path.getmtime(file) < modified_before:
+                    os.remove(file)
+                    count += 1
+            except OSError:
+                pass
+        try:
+            os.rmdir(directory)
+        except OSError:
+            # Still holds a file being written by a long running process
+            pass
+    return count, not os.path.exists(path)
+
+
+def __compress_day(path, modified_before):
+    '''
+    Compress every file of a day directory not modified since <modified_before>
+
+    :return: number of files compressed and True if nothing was left behind
+    '''
+
+    count = 0
+    complete = True
+    for directory, _, names in os.walk(path):
+        for name in names:
+            file = os.path.join(directory, name)
+            if name.endswith(COMPRESSED_SUFFIX) or name.endswith(__TEMP_SUFFIX):
+                continue
+            try:
+                if name.endswith(INDEX_SUFFIX):
+                    # Search index of a log (see log_search), useless once the log is compressed
+                    os.remove(file)
+                elif os.path.getmtime(file) >= modified_before:
+                    # Still being written by a long running process
+                    complete = False
+                else:
+                    compress_file(file)
+                    count += 1
+            except OSError:
+                complete = False
+    return count, complete
+
+
+def __watermark(state, *keys):
+    marks = [state[key] for key in keys if state.get(key)]
+    return date.fromisoformat(max(marks)) if marks else None
+
+
+def apply_retention(tree: str, policy: RetentionPolicy, base_dir: str = None, today: date = None,
+                    max_directories: int = None, recheck_days: int = __RECHECK_DAYS):
+    '''
+    Apply a retention policy on a dated tree (log or files). Files modified after a cutoff (still being written by a
+    long running process) are left alone. The last date directory fully deleted and fully compressed are kept on
+    <tree>/.retention.json, so each run only visits the date directories between them (less <recheck_days>) and the
+    cutoff dates
+
+    :param tree: LOG_TREE or FILES_TREE
+    :param policy: RetentionPolicy to be applied
+    :param base_dir: directory holding the tree. Defaults to the directory of the running script
+    :param today: reference date for the cutoffs. Defaults to today
+    :param max_directories: max amount of date directories changed (for incremental runs). No limit if not specified
+    :param recheck_days: days behind the last date directory deleted / compressed visited again
+    :return: dict with the amount of directories deleted, directories with files compressed and files compressed
+    '''
+
+    root = os.path.join(base_dir or BASE_DIR, tree)
+    parse_month = __TREE_MONTHS[tree]
+    today = today or date.today()
+    state = __read_state(root)
+    summary = {'deleted': 0, 'compressed': 0, 'files': 0}
+    budget = max_directories if max_directories is not None else float('inf')
+    if not os.path.isdir(root):
+        return summary
+
+    if policy.delete_after is not None:
+        cutoff = today - timedelta(days=policy.delete_after)
+        modified_before = time.mktime(cutoff.timetuple())
+        watermark = __watermark(state, 'deleted')
+        after = watermark - timedelta(days=recheck_days) if watermark else None
+        contiguous = True
+        for day, path in __dated_days(root, parse_month, after, cutoff):
+            if budget <= 0:
+                break
+            count, complete = __delete_day(path, modified_before)
+            if complete:
+                __remove_empty_parents(path, root)
+                summary['deleted'] += 1
+            if count:
+                budget -= 1
+            if watermark and day <= watermark:
+                # Rechecked day, already behind the mark
+                continue
+            # Days holding a file still being written are visited again on the next runs
+            contiguous = contiguous and complete
+            if contiguous:
+                state['deleted'] = day.isoformat()
+                __write_state(root, state)
+
+    if policy.compress_after is not None:
+        cutoff = today - timedelta(days=policy.compress_after)
+        modified_before = time.mktime(cutoff.timetuple())
+        watermark = __watermark(state, 'compressed', 'deleted')
+        after = watermark - timedelta(days=recheck_days) if watermark else None
+        contiguous = True
+        for day, path in __dated_days(root, parse_month, after, cutoff):
+            if budget <= 0:
+                break
+            count, complete = __compress_day(path, modified_before)
+            summary['files'] += count
+            if count:
+                summary['compressed'] += 1
+                budget -= 1
+            if watermark and day <= watermark:
+                # Rechecked day, already behind the mark
+                continue
+            # Days holding a file still being written are visited again on the next runs, their other files (and
+            # the days after them) are compressed anyway
+            contiguous = contiguous and complete
+            if contiguous:
+                state['compressed'] = day.isoformat()
+                __write_state(root, state)
+
+    return summary
+
+
+class RetentionManager:
+    '''
+    Apply retention policies on the log and files trees, once or periodically on a background thread
+    '''
+
+    def __init__(self, base_dir: str = None, log_policy: RetentionPolicy = RetentionPolicy(2, 90),
+                 files_policy: RetentionPolicy = None, max_directories: int = None):
+        '''
+        :param base_dir: directory holding the log and files trees. Defaults to the directory of the running script
+        :param log_policy: policy of the log tree. None leaves the tree untouched
+        :param files_policy: policy of the files tree. None leaves the tree untouched
+        :param max_directories: max amount of date directories changed per tree on each run
+        '''
+
+        self.base_dir = base_dir
+        self.policies = {LOG_TREE: log_policy, FILES_TREE: files_policy}
+        self.max_directories = max_directories
+        self._stop = threading.Event()
+        self._thread = None
+
+    def run_once(self, today: date = None):
+        '''
+        Apply the policies once
+
+        :param today: reference date for the cutoffs. Defaults to today
+        :return: dict of summaries by tree
+        '''
+
+        return {tree: apply_retention(tree=tree, policy=policy, base_dir=self.base_dir, today=today,
+                                      max_directories=self.max_directories)
+                for tree, policy in self.policies.items() if policy}
+
+    def start(self, interval: int = 3600):
+        '''
+        Apply the policies every <interval> seconds on a daemon thread
+
+        :param interval: seconds between runs
+        '''
+
+        if self._thread and self._thread.is_alive():
+            return
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._loop, args=(interval,), name='dgm-retention', daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout: float = None):
+        '''
+        Stop the background thread after the current run
+
+        :param timeout: max seconds to wait for the thread
+        '''
+
+        self._stop.set()
+        if self._thread:
+            self._thread.join(timeout)
+
+    def _loop(self, interval):
+        while not self._stop.is_set():
+            try:
+                self.run_once()
+            except Exception as e:
+                print('retention error: {e}'.format(e=e))
+            self._stop.wait(interval)
+
+
+def main(args=None):
+    parser = argparse.ArgumentParser(description='Compress and delete old date directories of the log and files trees')
+    # No default: run as a script, the directory of the running script is this library's own
+    parser.add_argument('--base-dir', required=True, help='directory of the application holding the log/files trees')
+    parser.add_argument('--log-compress-after', type=int, default=2, help='days to gzip logs (default: %(default)s)')
+    parser.add_argument('--log-delete-after', type=int, default=90, help='days to delete logs (default: %(default)s)')
+    parser.add_argument('--files-compress-after', type=int, help='days to gzip files (default: never)')
+    parser.add_argument('--files-delete-after', type=int, help='days to delete files (default: never)')
+    parser.add_argument('--max-directories', type=int, help='max date directories changed per tree on each run')
+    parser.add_argument('--interval', type=int,
+                        help='keep running, applying the policies every INTERVAL seconds')
+    options = parser.parse_args(args)
+
+    files_policy = RetentionPolicy(options.files_compress_after, options.files_delete_after)
+    manager = RetentionManager(base_dir=options.base_dir,
+                               log_policy=RetentionPolicy(options.log_compress_after, options.log_delete_after),
+                               files_policy=files_policy if any(d is not None for d in files_policy) else None,
+                               max_directories=options.max_directories)
+    try:
+        while True:
+            for tree, summary in manager.run_once().items():
+                print('{n} {t}: {d} directories deleted, {c} directories ({f} files) compressed'.format(
+                    n=datetime.now().strftime('%Y-%m-%d %H:%M:%S'), t=tree, d=summary['deleted'],
+                    c=summary['compressed'], f=summary['files']))
+            if not options.interval:
+                break
+            time.sleep(options.interval)
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == '__main__':
+    main()
@@ -29,6 +29,8 @@ from urllib3 import disable_warnings
 __OUTPUT_LINE_SIZE = 80
 __INDENT_SIZE = 4
 __COMMA_SPACE = ', '
+__TIMESTAMP_FORMAT = '%Y-%m-%d %H:%M:%S'
+__FILE_TIMESTAMP_FORMAT = '%Y-%m-%d_%H-%M-%S'
 
 __today = date.today()
 __file_name = os.path.basename(sys.argv[0] if sys.argv[0] else 'dgm_lib.core.utils.py')
@@ -38,6 +40,9 @@ __log_file = os.path.join(__log_dir, os.path.basename(__file_name).replace('.py'
 __database_log_file = __log_file.replace('.log', '_database.log')
 __files_dir = os.path.join(__base_dir, 'files', __today.strftime('%Y'), __today.strftime('%b'), __today.strftime('%d'))
 
+# Format string -> (second since epoch, text rendered for that second)
+__timestamp_cache = {}
+
 print('')
 print(str('*' * __OUTPUT_LINE_SIZE))
 print('D G M   L I B')
@@ -63,15 +68,8 @@ class LogLevel(Enum):
 
 # TODO: Use python standard logging
 class LogApplication:
-    _level = LogLevel.debug
-
-    @property
-    def level(self):
-        return self._level
-
-    @level.setter
-    def level(self, value):
-        self._level = value
+    # Application wide: change it with LogApplication.level = LogLevel.<level>
+    level = LogLevel.debug
 
 
 # TODO: Reorganize loggers by level. Create specific methods (info, debug, warning, etc)
@@ -91,17 +89,18 @@ def __log(text, indent_level, truncate_file, log_file, break_line, level=LogLeve
         print('creating the log directory {d}'.format(d=__log_dir))
         os.makedirs(__log_dir)
 
-    if level < LogApplication.level:
+    if level.value < LogApplication.level.value:
         return
 
-    s = '{h} - [{l}]: '.format(h=str(current_time()), l=level.name.upper())
+    s = '{h} - [{l}]: '.format(h=current_time(), l=level.name.upper())
     if not break_line:
         s += indent_text(text='> {t}'.format(t=text), indent_level=indent_level)
     with open(log_file, 'w' if not break_line and truncate_file else 'a') as f:
         if truncate_file:
             f.write('{a}\n'.format(a=str('*' * __OUTPUT_LINE_SIZE)))
-            f.write(justify_text(__file_name.replace('.py', '')).uper().center(__OUTPUT_LINE_SIZE))
+            f.write('{n}\n'.format(n=__file_name.replace('.py', '').upper().center(__OUTPUT_LINE_SIZE)))
             f.write('{a}\n'.format(a=str('*' * __OUTPUT_LINE_SIZE)))
+        f.write('{s}\n'.format(s=s))
 
     try:
         print(s)
@@ -127,7 +126,9 @@ def __error(msg, exception, indent_level, finish, driver, db):
     if exception:
         log_function(text='Reason: {e}'.format(e=exception), indent_level=indent_level + 1, level=LogLevel.error)
     if driver:
-        take_screenshot_webdriver(driver, 'ERROR - {f}_{d}.png'.format(f=__file_name, d=now()))
+        moment = now(fmt=__FILE_TIMESTAMP_FORMAT, milliseconds=True)
+        take_screenshot_webdriver(driver, os.path.join(__base_dir, 'screenshot',
+                                                       'ERROR - {f}_{d}.png'.format(f=__file_name, d=moment)))
     if finish:
         terminate_processing(error=msg)
 
@@ -162,15 +163,41 @@ def database_error(msg, exception=None, indent_level=0, finish=True, driver=None
     __error(msg=msg, exception=exception, indent_level=indent_level, finish=finish, driver=driver, db=True)
 
 
-def now(fmt='%Y-%m-%d %H:%M:%S'):
+def now(fmt=__TIMESTAMP_FORMAT, milliseconds=False):
     '''
-    Return current datetime in specified format
+    Return current datetime in specified format. The text is rendered once per second for each format and reused by
+    the following calls on the same second
 
     :param fmt: desired format
+    :param milliseconds: append the milliseconds (.mmm) to the formatted datetime
     :return: current datetime in specified format
     '''
 
-    return str(datetime.now().strftime(fmt))
+    moment = time.time()
+    if '%f' in fmt:
+        # Sub-second directives change on every call and can't be cached
+        text = datetime.fromtimestamp(moment).strftime(fmt)
+    else:
+        second = int(moment)
+        cached = __timestamp_cache.get(fmt)
+        if not cached or cached[0] != second:
+            cached = (second, datetime.fromtimestamp(second).strftime(fmt))
+            __timestamp_cache[fmt] = cached
+        text = cached[1]
+    if milliseconds:
+        text = '{t}.{m:03d}'.format(t=text, m=int(moment * 1000) % 1000)
+    return text
+
+
+def current_time(milliseconds=False):
+    '''
+    Return current datetime in the log header format
+
+    :param milliseconds: append the milliseconds (.mmm) to the formatted datetime
+    :return: current datetime in the log header format
+    '''
+
+    return now(fmt=__TIMESTAMP_FORMAT, milliseconds=milliseconds)
 
 
 def indent_text(text, indent_level=0):
@@ -214,7 +241,11 @@ def take_screenshot_webdriver(driver, filename: str = None):
     :param filename: path for new image file
     '''
 
-    file = filename if filename else os.path.join(__base_dir, 'screenshot', now('%'))
+    if filename:
+        file = filename
+    else:
+        moment = now(fmt=__FILE_TIMESTAMP_FORMAT, milliseconds=True)
+        file = os.path.join(__base_dir, 'screenshot', '{d}.png'.format(d=moment))
     if not os.path.exists(os.path.dirname(file)):
         os.makedirs(os.path.dirname(file))
     driver.get_screenshot_as_file(file)
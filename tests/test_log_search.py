@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+import os
+from datetime import datetime
+
+from core import log_search
+
+
+def write_log(log_root, day: datetime, name, lines, mode='w'):
+    directory = os.path.join(str(log_root), day.strftime('%Y'), day.strftime('%m.%b'), day.strftime('%d'))
+    os.makedirs(directory, exist_ok=True)
+    file = os.path.join(directory, name)
+    with open(file, mode) as f:
+        f.write(''.join(lines))
+    return file
+
+
+def test_search_reads_only_requested_levels_and_range(tmp_path):
+    day = datetime(2026, 10, 19)
+    write_log(tmp_path, day, 'job_1.log', [
+        '2026-10-19 09:59:59 - [ERROR]: > before\n',
+        '2026-10-19 10:00:00 - [INFO]: > info\n',
+        '2026-10-19 10:30:00 - [ERROR]: > inside\n',
+        'continuation\n',
+        '2026-10-19 11:00:00 - [ERROR]: > after\n',
+    ])
+    write_log(tmp_path, day, 'other_2.log', ['2026-10-19 10:30:00 - [ERROR]: > other script\n'])
+
+    records = list(log_search.search_logs(start=datetime(2026, 10, 19, 10), end=datetime(2026, 10, 19, 11),
+                                          levels=['error'], script='job', log_root=str(tmp_path)))
+
+    assert [(r.timestamp, r.level, r.text) for r in records] == [('2026-10-19 10:30:00', 'ERROR',
+                                                                  '> inside\ncontinuation')]
+
+
+def test_index_is_updated_incrementally_and_not_rewritten_for_a_pending_line(tmp_path):
+    file = write_log(tmp_path, datetime(2026, 10, 19), 'job_1.log', [
+        '2026-10-19 10:00:00 - [INFO]: > first\n',
+        '2026-10-19 10:01:00 - [ERROR]: > pend',
+    ])
+
+    index = log_search.build_log_index(file)
+    assert [m[0] for m in index['minutes']] == ['2026-10-19 10:00']
+    os.utime(file + '.idx', ns=(0, 0))
+
+    log_search.build_log_index(file)
+    assert os.stat(file + '.idx').st_mtime_ns == 0
+
+    write_log(tmp_path, datetime(2026, 10, 19), 'job_1.log', ['ing\n'], mode='a')
+    index = log_search.build_log_index(file)
+    assert [(m[0], m[3]) for m in index['minutes']] == [('2026-10-19 10:00', {'INFO': 1}),
+                                                        ('2026-10-19 10:01', {'ERROR': 1})]
+    assert [r.text for r in log_search.search_logs(levels=['ERROR'], log_root=str(tmp_path))] == ['> pending']
+
+
+def test_truncated_log_is_indexed_again(tmp_path):
+    day = datetime(2026, 10, 19)
+    file = write_log(tmp_path, day, 'job_1.log', ['2026-10-19 10:00:00 - [ERROR]: > old record\n'])
+    log_search.build_log_index(file)
+
+    write_log(tmp_path, day, 'job_1.log', ['2026-10-19 11:00:00 - [INFO]: > new\n'])
+
+    assert [r.text for r in log_search.search_logs(log_root=str(tmp_path))] == ['> new']
+
+
+def test_search_finds_records_of_processes_started_on_previous_days(tmp_path):
+    started = write_log(tmp_path, datetime(2026, 10, 18), 'app_1.log', [
+        '2026-10-18 23:00:00 - [ERROR]: > yesterday\n',
+        '2026-10-19 10:30:00 - [ERROR]: > today\n',
+    ])
+    finished = write_log(tmp_path, datetime(2026, 10, 18), 'old_2.log', ['2026-10-18 10:30:00 - [ERROR]: > old\n'])
+    too_old = write_log(tmp_path, datetime(2026, 10, 1), 'app_3.log', ['2026-10-19 10:40:00 - [ERROR]: > too old\n'])
+    os.utime(finished, (0, datetime(2026, 10, 18, 11).timestamp()))
+    for file in (started, too_old):
+        os.utime(file, (0, datetime(2026, 10, 19, 10, 30).timestamp()))
+
+    records = list(log_search.search_logs(start=datetime(2026, 10, 19, 10), end=datetime(2026, 10, 19, 11),
+                                          levels=['ERROR'], log_root=str(tmp_path)))
+
+    assert [(r.file, r.text) for r in records] == [(started, '> today')]
+    assert list(log_search.iter_log_files(start=datetime(2026, 10, 19), end=datetime(2026, 10, 19),
+                                          log_root=str(tmp_path), lookback=30)) == [too_old, started]
@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+import gzip
+import json
+import os
+from datetime import date, datetime
+
+from core import log_search, retention
+
+
+def write_log(base_dir, day: date, name, text, modified: date = None):
+    directory = os.path.join(str(base_dir), 'log', day.strftime('%Y'), day.strftime('%m.%b'), day.strftime('%d'))
+    os.makedirs(directory, exist_ok=True)
+    file = os.path.join(directory, name)
+    with open(file, 'a') as f:
+        f.write(text)
+    modified = datetime.combine(modified or day, datetime.min.time()).timestamp()
+    os.utime(file, (modified, modified))
+    return file
+
+
+def test_compress_file_appends_to_an_existing_archive(tmp_path):
+    file = write_log(tmp_path, date(2026, 10, 18), 'app_1.log', '2026-10-18 10:00:00 - [INFO]: > first\n')
+    retention.compress_file(file)
+    write_log(tmp_path, date(2026, 10, 18), 'app_1.log', '2026-10-20 10:00:00 - [ERROR]: > reopened\n')
+
+    target = retention.compress_file(file)
+
+    assert not os.path.exists(file)
+    with gzip.open(target, 'rt') as f:
+        assert f.read() == '2026-10-18 10:00:00 - [INFO]: > first\n2026-10-20 10:00:00 - [ERROR]: > reopened\n'
+    assert [r.text for r in log_search.search_logs(log_root=os.path.join(str(tmp_path), 'log'))] == ['> first',
+                                                                                                   '> reopened']
+
+
+def test_days_behind_the_watermark_are_rechecked(tmp_path):
+    file = write_log(tmp_path, date(2026, 10, 18), 'app_1.log', '2026-10-18 10:00:00 - [INFO]: > first\n')
+    policy = retention.RetentionPolicy(2, None)
+    retention.apply_retention(retention.LOG_TREE, policy, base_dir=str(tmp_path), today=date(2026, 10, 21))
+    assert os.path.exists(file + '.gz')
+    write_log(tmp_path, date(2026, 10, 18), 'app_1.log', '2026-10-20 10:00:00 - [INFO]: > reopened\n',
+              modified=date(2026, 10, 20))
+
+    summary = retention.apply_retention(retention.LOG_TREE, policy, base_dir=str(tmp_path), today=date(2026, 10, 28))
+
+    assert summary['files'] == 1 and not os.path.exists(file)
+    with gzip.open(file + '.gz', 'rt') as f:
+        assert f.read().count('\n') == 2
+
+
+def read_state(base_dir):
+    state_file = os.path.join(str(base_dir), 'log', '.retention.json')
+    if not os.path.exists(state_file):
+        return {}
+    with open(state_file) as f:
+        return json.load(f)
+
+
+def test_compress_and_delete_cutoffs(tmp_path):
+    files = {day: write_log(tmp_path, day, 'job_1.log', 'record\n')
+             for day in (date(2026, 7, 20), date(2026, 7, 21), date(2026, 10, 16), date(2026, 10, 17))}
+    with open(files[date(2026, 10, 16)] + '.idx', 'w') as f:
+        f.write('{}')
+
+    summary = retention.apply_retention(retention.LOG_TREE, retention.RetentionPolicy(2, 90), base_dir=str(tmp_path),
+                                        today=date(2026, 10, 19))
+
+    assert summary == {'deleted': 1, 'compressed': 2, 'files': 2}
+    assert not os.path.exists(os.path.dirname(files[date(2026, 7, 20)]))
+    assert os.path.exists(files[date(2026, 7, 21)] + '.gz')
+    assert os.path.exists(files[date(2026, 10, 16)] + '.gz')
+    assert not os.path.exists(files[date(2026, 10, 16)] + '.idx')
+    assert os.path.exists(files[date(2026, 10, 17)])
+    assert read_state(tmp_path) == {'deleted': '2026-07-20', 'compressed': '2026-10-16'}
+
+
+def test_busy_files_are_skipped_without_stopping_later_days(tmp_path):
+    busy = write_log(tmp_path, date(2026, 10, 5), 'daemon_1.log', 'record\n', modified=date(2026, 10, 19))
+    idle = write_log(tmp_path, date(2026, 10, 5), 'job_2.log', 'record\n')
+    later = write_log(tmp_path, date(2026, 10, 10), 'job_3.log', 'record\n')
+    policy = retention.RetentionPolicy(2, None)
+
+    retention.apply_retention(retention.LOG_TREE, policy, base_dir=str(tmp_path), today=date(2026, 10, 19))
+
+    assert os.path.exists(busy) and not os.path.exists(busy + '.gz')
+    assert os.path.exists(idle + '.gz') and os.path.exists(later + '.gz')
+    assert 'compressed' not in read_state(tmp_path)
+
+    os.utime(busy, (0, datetime(2026, 10, 5).timestamp()))
+    summary = retention.apply_retention(retention.LOG_TREE, policy, base_dir=str(tmp_path), today=date(2026, 10, 19))
+
+    assert summary['files'] == 1 and os.path.exists(busy + '.gz')
+    assert read_state(tmp_path) == {'compressed': '2026-10-10'}
+
+
+def test_busy_files_are_not_deleted(tmp_path):
+    busy = write_log(tmp_path, date(2026, 7, 1), 'daemon_1.log', 'record\n', modified=date(2026, 10, 19))
+    old = write_log(tmp_path, date(2026, 7, 1), 'job_2.log', 'record\n')
+    gone = write_log(tmp_path, date(2026, 7, 2), 'job_3.log', 'record\n')
+
+    summary = retention.apply_retention(retention.LOG_TREE, retention.RetentionPolicy(None, 90),
+                                        base_dir=str(tmp_path), today=date(2026, 10, 19))
+
+    assert summary['deleted'] == 1
+    assert os.path.exists(busy) and not os.path.exists(old) and not os.path.exists(gone)
+    assert 'deleted' not in read_state(tmp_path)
+
+
+def test_incremental_runs_advance_the_watermark(tmp_path):
+    for day in range(10, 14):
+        write_log(tmp_path, date(2026, 10, day), 'job_1.log', 'record\n')
+    policy = retention.RetentionPolicy(2, None)
+    marks = []
+    for _ in range(5):
+        summary = retention.apply_retention(retention.LOG_TREE, policy, base_dir=str(tmp_path),
+                                            today=date(2026, 10, 19), max_directories=1)
+        marks.append((summary['compressed'], read_state(tmp_path).get('compressed')))
+
+    assert marks == [(1, '2026-10-10'), (1, '2026-10-11'), (1, '2026-10-12'), (1, '2026-10-13'), (0, '2026-10-13')]
+
+
+def test_manager_applies_the_files_policy_by_month_name(tmp_path):
+    directory = os.path.join(str(tmp_path), 'files', '2026', date(2026, 7, 1).strftime('%b'), '01')
+    os.makedirs(directory)
+    file = os.path.join(directory, 'report.xlsx')
+    open(file, 'w').close()
+    os.utime(file, (0, datetime(2026, 7, 1).timestamp()))
+
+    manager = retention.RetentionManager(base_dir=str(tmp_path), files_policy=retention.RetentionPolicy(None, 90))
+
+    assert manager.run_once(today=date(2026, 10, 19))['files']['deleted'] == 1
+    assert not os.path.exists(os.path.join(str(tmp_path), 'files', '2026'))